@@ -4,19 +4,33 @@ Google Pay Smart Analyzer API with CrewAI
 Advanced AI-powered transaction analysis using CrewAI agents
 """
 
-import json
+import asyncio
+import calendar
+import codecs
+import hashlib
+import multiprocessing
 import os
 import re
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from collections import defaultdict, Counter
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
+import numpy as np
+import orjson
+import pandas as pd
 from bs4 import BeautifulSoup
-from crewai import Agent, Task, Crew, Process, LLM
+from cachetools import TTLCache
+from lxml import etree
+from crewai import Agent, Task, Crew, LLM, BaseLLM
 from crewai.tools import tool
 from dotenv import load_dotenv
 
+try:
+    import re2
+except ImportError:
+    re2 = None
+
 # Load environment
 load_dotenv()
 
@@ -29,9 +43,16 @@ if GEMINI_API_KEY:
     os.environ["GOOGLE_API_KEY"] = GEMINI_API_KEY
     os.environ["GOOGLE_GENAI_API_KEY"] = GEMINI_API_KEY
 
-# Setup Gemini LLM for CrewAI
+# Shared Gemini LLM for CrewAI, created once by configure_gemini_llm() at
+# startup rather than at import so parse-pool workers never build it
 gemini_llm = None
-if GEMINI_API_KEY:
+
+def configure_gemini_llm():
+    """Setup the Gemini LLM for CrewAI"""
+    global gemini_llm
+    if not GEMINI_API_KEY:
+        return
+    
     try:
         # Set environment variable for Google GenAI
         os.environ["GOOGLE_API_KEY"] = GEMINI_API_KEY
@@ -50,6 +71,36 @@ if GEMINI_API_KEY:
         gemini_llm = "gemini-1.5-flash"
         print("✅ Using string-based Gemini configuration")
 
+# Precompiled patterns for parsing Google Pay activity blocks
+_BODY_TEXT_XPATH = etree.XPath("descendant::div[contains(@class,'mdl-typography--body-1')][1]")
+
+_MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12,
+}
+
+# One pass over "Paid ₹X to Y using Z [XXXX1234] [on] D Mon YYYY"
+_TXN_PATTERN = (
+    r'₹\s*(?P<amount>[0-9,]+(?:\.[0-9]+)?)\s+to\s+(?P<recipient>.+?)'
+    r'(?:\s+using\s+(?P<method>[A-Za-z0-9 \-&()/.]+?)(?:\s+[Xx]+\d*)?)?'
+    r'\s+(?:on\s+)?(?P<day>\d{1,2})\s+(?P<mon>[A-Za-z]{3})\s+(?P<year>\d{4})'
+)
+
+def compile_txn_pattern(pattern: str):
+    """Compile with RE2 when available, falling back to the stdlib engine
+    
+    The lazy recipient/method groups make the backtracking re engine
+    super-linear on crafted block text; RE2 matches in linear time.
+    """
+    if re2 is not None:
+        try:
+            return re2.compile(pattern)
+        except re2.error as e:
+            print(f"Warning: RE2 could not compile transaction pattern: {e}")
+    return re.compile(pattern)
+
+_TXN_RE = compile_txn_pattern(_TXN_PATTERN)
+
 # Initialize FastAPI
 app = FastAPI(title="Google Pay Smart Analyzer with CrewAI", version="2.0.0")
 
@@ -62,67 +113,260 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@tool
-def analyze_transaction_data(transaction_data: str) -> str:
-    """Analyze Google Pay transaction data for patterns, insights, and recommendations"""
+def monthly_totals(dates: np.ndarray, amounts: np.ndarray) -> Dict[str, float]:
+    """Total amount per calendar month, keyed "YYYY-MM" in chronological order"""
+    valid = ~np.isnat(dates)
+    months = dates[valid].astype('datetime64[M]').astype(np.int64)
+    if not months.size:
+        return {}
+    
+    # Bucket by month offset from the earliest month: one C-level pass each for
+    # the sums and the counts, instead of a hash-based groupby
+    first = months.min()
+    offsets = months - first
+    totals = np.bincount(offsets, weights=amounts[valid])
+    counts = np.bincount(offsets)
+    
+    return {
+        str(np.datetime64(int(first + offset), 'M')): float(totals[offset])
+        for offset in np.flatnonzero(counts)
+    }
+
+class TransactionTable:
+    """Parsed transactions stored column-wise as parallel numpy arrays
+    
+    Recipients and payment methods repeat heavily, so they are kept as pandas
+    Categoricals: integer codes per row plus one copy of each distinct string.
+    """
+    
+    def __init__(self, amounts: np.ndarray, recipients: pd.Categorical, dates: np.ndarray,
+                 methods: pd.Categorical, ids: np.ndarray):
+        self.amounts = amounts
+        self.recipients = recipients
+        self.dates = dates
+        self.methods = methods
+        self.ids = ids
+        
+        # Oldest-first row order, sorted once so timeframe filters are a binary
+        # search. Sorting the reversed dates keeps same-day rows in reverse parse
+        # order, so reading a tail backwards gives newest-first in parse order.
+        self.date_order = dates.size - 1 - np.argsort(dates[::-1], kind='stable')
+        self.sorted_dates = dates[self.date_order]
+    
+    @classmethod
+    def from_columns(cls, amounts: List[float], recipients: List[str], dates: List[str],
+                     methods: List[str], ids: List[str]) -> "TransactionTable":
+        """Build a table from per-column lists, with dates as ISO strings"""
+        return cls(
+            np.array(amounts, dtype=np.float64),
+            pd.Categorical(recipients),
+            np.array(dates, dtype='datetime64[D]'),
+            pd.Categorical(methods),
+            np.array(ids, dtype=object),
+        )
+    
+    @classmethod
+    def empty(cls) -> "TransactionTable":
+        return cls.from_columns([], [], [], [], [])
+    
+    def __len__(self) -> int:
+        return self.amounts.size
+    
+    def take(self, indices: np.ndarray) -> "TransactionTable":
+        """Rows at the given positions, in that order"""
+        return TransactionTable(
+            self.amounts[indices],
+            self.recipients[indices],
+            self.dates[indices],
+            self.methods[indices],
+            self.ids[indices],
+        )
+    
+    def date_range(self) -> Dict[str, Optional[str]]:
+        """First and last transaction date as ISO strings"""
+        if not len(self):
+            return {"start": None, "end": None}
+        return {"start": str(self.dates.min()), "end": str(self.dates.max())}
+    
+    @staticmethod
+    def category_counts(column: pd.Categorical, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Most frequent values of a categorical column with their counts"""
+        # Count integer codes rather than hashing strings; categories are
+        # sorted, and the stable sort keeps ties in alphabetical order
+        names = column.categories
+        counts = np.bincount(column.codes, minlength=len(names))
+        order = np.argsort(-counts, kind='stable')[:limit]
+        # Filtered tables keep every category, so skip ones with no rows
+        return [(str(names[i]), int(counts[i])) for i in order if counts[i]]
+    
+    def top_recipients(self, limit: int) -> List[Tuple[str, int]]:
+        """Most frequent recipients with their transaction counts"""
+        return self.category_counts(self.recipients, limit)
+    
+    def analysis(self) -> Dict:
+        """Spending statistics, trends and breakdowns as a JSON-friendly dict"""
+        total = float(self.amounts.sum())
+        return {
+            "total_spend": total,
+            "average_transaction": total / len(self) if len(self) else 0.0,
+            "transaction_count": len(self),
+            "top_merchants": dict(self.top_recipients(5)),
+            "monthly_trends": monthly_totals(self.dates, self.amounts),
+            "payment_methods": dict(self.category_counts(self.methods)),
+            "date_range": self.date_range()
+        }
+    
+    def prompt_summary(self, top: int = 5) -> str:
+        """Compact description of the transactions for LLM prompts
+        
+        Aggregates cost far fewer tokens than raw JSON rows and cover every
+        transaction rather than an arbitrary first few.
+        """
+        date_range = self.date_range()
+        merchants = ', '.join(f"{name} ({count})" for name, count in self.top_recipients(top))
+        monthly = ', '.join(
+            f"{month}: ₹{total:.0f}"
+            for month, total in monthly_totals(self.dates, self.amounts).items()
+        )
+        largest = '; '.join(
+            f"₹{self.amounts[i]:.0f} to {self.recipients[i]} on {self.dates[i]}"
+            for i in np.argsort(-self.amounts, kind='stable')[:top]
+        )
+        return (
+            f"count={len(self)}, total=₹{self.amounts.sum():.0f}, "
+            f"dates={date_range['start']}..{date_range['end']}, "
+            f"top_merchants=[{merchants}], monthly=[{monthly}], largest=[{largest}]"
+        )
+    
+    def to_records(self, limit: Optional[int] = None) -> List[Dict]:
+        """Rows as JSON-friendly dicts, as returned by the API"""
+        rows = slice(None, limit)
+        return [
+            {
+                'amount': amount,
+                'recipient': recipient,
+                'date': date,
+                'payment_method': method,
+                'id': tx_id
+            }
+            for amount, recipient, date, method, tx_id in zip(
+                self.amounts[rows].tolist(),
+                self.recipients[rows].tolist(),
+                self.dates[rows].astype(str).tolist(),
+                self.methods[rows].tolist(),
+                self.ids[rows].tolist(),
+            )
+        ]
+
+def transaction_analysis_tool(transactions: TransactionTable):
+    """CrewAI tool that analyzes one request's transactions
+    
+    The agents only see a text summary in their prompts, so the tool is bound
+    to the request's table rather than taking transaction JSON as input.
+    """
+    @tool("analyze_transaction_data")
+    def analyze_transaction_data() -> str:
+        """Analyze the Google Pay transactions being discussed: total and average spend, top merchants, monthly trends, payment methods and date range"""
+        return orjson.dumps(transactions.analysis(), option=orjson.OPT_INDENT_2).decode()
+    
+    return analyze_transaction_data
+
+# Bytes fed to the incremental HTML parser at a time
+PARSE_CHUNK_SIZE = 64 * 1024
+
+def stream_block_texts(content: bytes) -> List[Optional[str]]:
+    """Extract the body text of each transaction block with an incremental parser
+    
+    Each outer-cell block is discarded as soon as it has been read, so memory
+    stays bounded by one block rather than the whole document tree.
+    """
+    # Only div end events reach Python; everything else is skipped inside lxml
+    parser = etree.HTMLPullParser(events=('end',), tag='div', encoding='utf-8')
+    texts = []
+    
+    def drain():
+        for _, elem in parser.read_events():
+            cls = elem.get('class') or ''
+            if 'outer-cell' not in cls or 'mdl-shadow' not in cls:
+                continue
+            
+            main_text = _BODY_TEXT_XPATH(elem)
+            # Join text nodes with a space so the <br/>-separated date is not
+            # glued onto the masked account number
+            texts.append(' '.join(main_text[0].itertext()) if main_text else None)
+            
+            # Free this block and any already-processed siblings
+            elem.clear(keep_tail=True)
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    
+    with memoryview(content) as view:
+        for start in range(0, len(view), PARSE_CHUNK_SIZE):
+            parser.feed(bytes(view[start:start + PARSE_CHUNK_SIZE]))
+            drain()
+    parser.close()
+    drain()
+    
+    return texts
+
+def parse_transactions(content: Union[str, bytes]) -> TransactionTable:
+    """Convert Google Pay HTML content to structured JSON with improved date parsing"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    
     try:
-        data = json.loads(transaction_data)
-        
-        if len(data) == 0:
-            return "No transactions to analyze"
-        
-        # Basic analysis using pure Python
-        amounts = [tx['amount'] for tx in data]
-        total_spend = sum(amounts)
-        avg_transaction = total_spend / len(amounts) if amounts else 0
-        
-        # Count recipients
-        recipient_counts = Counter(tx['recipient'] for tx in data)
-        top_merchant = dict(recipient_counts.most_common(1))
-        
-        # Monthly trends
-        monthly_spend = defaultdict(float)
-        for tx in data:
-            try:
-                date_obj = datetime.strptime(tx['date'], '%Y-%m-%d')
-                month = date_obj.strftime('%Y-%m')
-                monthly_spend[month] += tx['amount']
-            except:
+        texts = stream_block_texts(content)
+    except etree.LxmlError:
+        # Fall back to BeautifulSoup for content lxml cannot handle; the pull
+        # parser raises XMLSyntaxError from close() on e.g. an empty document
+        soup = BeautifulSoup(content.decode('utf-8', errors='replace'), 'html.parser')
+        texts = []
+        for block in soup.select('div.outer-cell[class*="mdl-shadow"]'):
+            main_text = block.select_one('div[class*="mdl-typography--body-1"]')
+            texts.append(main_text.get_text(' ', strip=True) if main_text else None)
+    
+    amounts, recipients, dates, methods, ids = [], [], [], [], []
+    for i, text in enumerate(texts):
+        try:
+            if not text:
                 continue
-        
-        # Payment methods
-        payment_method_counts = Counter(tx['payment_method'] for tx in data)
-        payment_methods = dict(payment_method_counts)
-        
-        # Get top 5 merchants
-        top_merchants = dict(recipient_counts.most_common(5))
-        
-        # Get date range
-        dates = [tx['date'] for tx in data]
-        date_range = {
-            "start": min(dates) if dates else None,
-            "end": max(dates) if dates else None
-        }
-        
-        analysis = {
-            "total_spend": float(total_spend),
-            "average_transaction": float(avg_transaction),
-            "transaction_count": len(data),
-            "top_merchants": top_merchants,
-            "monthly_trends": dict(monthly_spend),
-            "payment_methods": payment_methods,
-            "date_range": date_range
-        }
-        
-        return json.dumps(analysis, indent=2)
-        
-    except Exception as e:
-        return f"Error analyzing data: {str(e)}"
+                
+            # Extract all fields with a single regex pass over
+            # whitespace-normalized text (exports wrap lines mid-sentence)
+            m = _TXN_RE.search(' '.join(text.split()))
+            if m is None:
+                continue
+            
+            amount = float(m.group('amount').replace(',', ''))
+            recipient = m.group('recipient').strip()
+            
+            # Parse date properly
+            day, month, year = m.group('day', 'mon', 'year')
+            method = m.group('method').strip() if m.group('method') else "UPI"
+            
+            # Validate and format date without going through strptime
+            mnum = _MONTHS.get(month.title())
+            day = int(day)
+            if mnum is None or not 1 <= day <= 31:
+                continue  # Skip invalid dates
+            if day > 28 and day > calendar.monthrange(int(year), mnum)[1]:
+                continue  # e.g. 31 Feb, which datetime64 would reject
+            date_formatted = f"{year}-{mnum:02d}-{day:02d}"
+            
+            amounts.append(amount)
+            recipients.append(recipient)
+            dates.append(date_formatted)
+            methods.append(method)
+            ids.append(f"tx_{i}")
+            
+        except Exception:
+            continue
+    
+    return TransactionTable.from_columns(amounts, recipients, dates, methods, ids)
 
 class GPPayAnalyzer:
     def __init__(self):
-        self.transactions = []
-        self.setup_crew()
+        self.transactions = TransactionTable.empty()
         
     def setup_crew(self):
         """Setup CrewAI agents and tasks"""
@@ -140,7 +384,6 @@ class GPPayAnalyzer:
                 backstory="""You are an expert financial analyst specializing in personal finance and transaction analysis. 
                 You excel at identifying spending patterns, detecting anomalies, and providing actionable financial insights 
                 from transaction data.""",
-                tools=[analyze_transaction_data],
                 llm=gemini_llm,
                 verbose=True,
                 allow_delegation=False
@@ -177,78 +420,29 @@ class GPPayAnalyzer:
             self.financial_advisor = None  
             self.insights_generator = None
         
-    def parse_html_content(self, html_content: str) -> List[Dict]:
+    def parse_html_content(self, html_content: str) -> TransactionTable:
         """Convert Google Pay HTML content to structured JSON with improved date parsing"""
-        soup = BeautifulSoup(html_content, 'html.parser')  # Use built-in parser instead of lxml
-        
-        # Find transaction blocks
-        blocks = soup.find_all('div', class_=re.compile(r'outer-cell.*mdl-shadow'))
-        
-        transactions = []
-        for i, block in enumerate(blocks):
-            try:
-                main_text = block.find('div', class_=re.compile(r'mdl-typography--body-1'))
-                if not main_text:
-                    continue
-                    
-                text = main_text.get_text(strip=True)
-                
-                # Extract key data using improved regex
-                amount_match = re.search(r'₹\s*([0-9,]+(?:\.[0-9]+)?)', text)
-                recipient_match = re.search(r'to\s+(.+?)(?:\s+using|\s+on)', text)
-                
-                # Better date pattern - looking for proper date format
-                date_match = re.search(r'(\d{1,2})\s+([A-Za-z]{3})\s+(\d{4})', text)
-                method_match = re.search(r'using\s+([A-Za-z0-9 \-&()/.]+?)(?:\s+[Xx]+|\s*$)', text)
-                
-                if amount_match and recipient_match and date_match:
-                    amount = float(amount_match.group(1).replace(',', ''))
-                    recipient = recipient_match.group(1).strip()
-                    
-                    # Parse date properly
-                    day, month, year = date_match.groups()
-                    method = method_match.group(1).strip() if method_match else "UPI"
-                    
-                    # Validate and format date
-                    try:
-                        date_obj = datetime.strptime(f"{day} {month} {year}", "%d %b %Y")
-                        date_formatted = date_obj.strftime("%Y-%m-%d")
-                    except ValueError:
-                        continue  # Skip invalid dates
-                    
-                    transactions.append({
-                        'amount': amount,
-                        'recipient': recipient,
-                        'date': date_formatted,
-                        'payment_method': method,
-                        'id': f"tx_{i}"
-                    })
-                    
-            except Exception:
-                continue
-        
-        self.transactions = transactions
-        return transactions
+        self.transactions = parse_transactions(html_content)
+        return self.transactions
     
-    def analyze_with_crewai(self, query: str, timeframe: str = "all") -> Dict:
+    async def analyze_with_crewai(self, query: str, timeframe: str = "all",
+                                  transactions: Optional[TransactionTable] = None) -> Dict:
         """Use CrewAI to analyze transactions and provide insights"""
         
         # Filter transactions
-        filtered_txns = self.filter_by_timeframe(timeframe)
+        filtered_txns = self.filter_by_timeframe(timeframe, transactions)
         
         if not filtered_txns:
             return {"error": f"No transactions found for timeframe: {timeframe}"}
         
-        # If no LLM configured, return basic analysis
-        if not gemini_llm or not hasattr(self, 'financial_analyst'):
-            amounts = [float(t['amount']) for t in filtered_txns]
-            total_spend = sum(amounts)
+        # If no LLM configured or the agents failed to initialize, return basic analysis
+        if not gemini_llm or not getattr(self, 'financial_analyst', None):
+            total_spend = float(filtered_txns.amounts.sum())
             
             # Count recipients
-            recipient_counts = Counter([t['recipient'] for t in filtered_txns])
-            top_merchant = recipient_counts.most_common(1)[0] if recipient_counts else ("N/A", 0)
+            top_merchant = next(iter(filtered_txns.top_recipients(1)), ("N/A", 0))
             
-            avg_transaction = total_spend / len(amounts) if amounts else 0
+            avg_transaction = total_spend / len(filtered_txns)
             
             return {
                 "summary": f"Analyzed {len(filtered_txns)} transactions for {timeframe} period",
@@ -263,51 +457,64 @@ class GPPayAnalyzer:
                 "ai_engine": "Basic Analysis (LLM not configured)"
             }
         
+        # Tasks run concurrently, so each one gets the transaction data directly
+        # instead of relying on the previous task's output
+        data_context = f"""
+            Transaction Summary: {filtered_txns.prompt_summary()}
+            Timeframe: {timeframe}
+            """
+        
+        # CrewAI stores per-run executor and crew state on the Agent objects, so
+        # concurrent analyses each get their own copies; the LLM client is shared
+        financial_analyst = self.financial_analyst.copy()
+        financial_advisor = self.financial_advisor.copy()
+        insights_generator = self.insights_generator.copy()
+        
         # Create tasks for CrewAI analysis
         analysis_task = Task(
             description=f"""
             Analyze the following Google Pay transaction data to answer: "{query}"
-            
-            Transaction Data: {json.dumps(filtered_txns[:10])}
-            Total Transactions: {len(filtered_txns)}
-            Timeframe: {timeframe}
-            
+            {data_context}
             Provide detailed financial analysis including spending patterns, top categories, and trends.
             """,
-            agent=self.financial_analyst,
+            agent=financial_analyst,
+            tools=[transaction_analysis_tool(filtered_txns)],
             expected_output="Comprehensive financial analysis with specific insights"
         )
         
         recommendations_task = Task(
             description=f"""
-            Based on the transaction analysis, provide financial recommendations for: "{query}"
-            
+            Based on the following Google Pay transaction data, provide financial recommendations for: "{query}"
+            {data_context}
             Focus on budget optimization, spending improvements, and savings opportunities.
             """,
-            agent=self.financial_advisor,
+            agent=financial_advisor,
             expected_output="Actionable financial recommendations"
         )
         
         insights_task = Task(
             description=f"""
-            Generate key insights answering: "{query}"
-            
+            Generate key insights from the following Google Pay transaction data answering: "{query}"
+            {data_context}
             Include 3-5 key findings, alerts, and improvement areas.
             """,
-            agent=self.insights_generator,
+            agent=insights_generator,
             expected_output="List of key insights and findings"
         )
         
-        # Create and run crew
+        # Run one single-task crew per agent concurrently, so total latency is
+        # the slowest LLM roundtrip rather than the sum of all three
         try:
-            crew = Crew(
-                agents=[self.financial_analyst, self.financial_advisor, self.insights_generator],
-                tasks=[analysis_task, recommendations_task, insights_task],
-                process=Process.sequential,
-                verbose=True
-            )
+            crews = [
+                Crew(agents=[agent], tasks=[task], verbose=True)
+                for agent, task in (
+                    (financial_analyst, analysis_task),
+                    (financial_advisor, recommendations_task),
+                    (insights_generator, insights_task),
+                )
+            ]
             
-            result = crew.kickoff()
+            await asyncio.gather(*(crew.kickoff_async() for crew in crews))
             
             return {
                 "summary": f"Analyzed {len(filtered_txns)} transactions for {timeframe} period",
@@ -321,32 +528,183 @@ class GPPayAnalyzer:
         except Exception as e:
             return {"error": f"CrewAI analysis failed: {str(e)}"}
     
-    def filter_by_timeframe(self, timeframe: str) -> List[Dict]:
+    def filter_by_timeframe(self, timeframe: str,
+                            transactions: Optional[TransactionTable] = None) -> TransactionTable:
         """Filter transactions by timeframe"""
-        if timeframe == "all":
-            return self.transactions
+        if transactions is None:
+            transactions = self.transactions
         
-        if not self.transactions:
-            return []
-        
-        # Sort transactions by date (newest first)
-        sorted_txns = sorted(self.transactions, key=lambda x: x['date'], reverse=True)
+        if timeframe == "all" or not len(transactions):
+            return transactions
         
         if "month" in timeframe.lower():
             if "three" in timeframe or "3" in timeframe:
-                return sorted_txns[:90]  # Last 90 transactions
+                days = 90
             else:
-                return sorted_txns[:30]  # Last 30 transactions
+                days = 30
         elif "week" in timeframe.lower():
-            return sorted_txns[:7]  # Last 7 transactions
+            days = 7
         elif "year" in timeframe.lower():
-            return sorted_txns[:365]  # Last 365 transactions
-            
-        return sorted_txns[:30]  # Default: last 30 transactions
+            days = 365
+        else:
+            days = 30  # Default: last 30 days
+        
+        # The window ends at the latest transaction in the export rather than
+        # today, so older exports still have data in every timeframe
+        cutoff = transactions.sorted_dates[-1] - np.timedelta64(days, 'D')
+        start = np.searchsorted(transactions.sorted_dates, cutoff, side='right')
+        
+        # Newest first
+        return transactions.take(transactions.date_order[start:][::-1])
+
+def compute_quick_insights(transactions: TransactionTable) -> Dict:
+    """Compute spending statistics for the quick-insights endpoint"""
+    count = len(transactions)
+    total_spend = float(transactions.amounts.sum())
+    
+    # Count recipients
+    top_name, top_count = next(iter(transactions.top_recipients(1)), ("N/A", 0))
+    
+    return {
+        "total_spend": total_spend,
+        "average_transaction": total_spend / count if count else 0.0,
+        "transaction_count": count,
+        "top_merchant": top_name,
+        "top_merchant_count": top_count,
+        "date_range": transactions.date_range()
+    }
+
+def detect_timeframe(query: str, timeframe: str = "all") -> str:
+    """Auto-detect timeframe from query when none was given explicitly"""
+    if timeframe == "all" and query:
+        if "month" in query.lower():
+            return "one month"
+        elif "week" in query.lower():
+            return "one week"
+        elif "year" in query.lower():
+            return "one year"
+    return timeframe
 
 # Initialize analyzer
 analyzer = GPPayAnalyzer()
 
+# Caps concurrent CrewAI runs to respect Gemini rate limits; each run makes
+# three LLM calls, one per agent
+llm_semaphore = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "4")))
+
+# Batches with more queries than this are rejected with 400, since the
+# semaphore only bounds concurrency, not how many LLM calls a request queues
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "10"))
+
+# Parsed transactions keyed by upload hash, and CrewAI results keyed by
+# (upload hash, normalized query, timeframe)
+parse_cache = TTLCache(maxsize=32, ttl=3600)
+insight_cache = TTLCache(maxsize=1024, ttl=3600)
+
+# Parsing is CPU-bound, so run it in worker processes to use every core
+# instead of contending for the GIL in threads. Workers come from a forkserver
+# (or are spawned where that is unavailable, e.g. Windows) rather than being
+# forked from the server, whose event loop and LLM client threads do not
+# survive a fork.
+PARSE_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+parse_pool = ProcessPoolExecutor(
+    max_workers=int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count(),
+    mp_context=multiprocessing.get_context(PARSE_START_METHOD)
+)
+
+# Uploads larger than this are rejected with 413 before parsing
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+# Bytes checked for UTF-8 up front; lxml reads the rest as bytes without a
+# separate Python-level decode of the whole file
+UTF8_SNIFF_BYTES = 64 * 1024
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an uploaded file, rejecting oversized or non-UTF-8 content early"""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded file is too large")
+    
+    content = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(content) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded file is too large")
+    
+    # Incremental decoder so a prefix ending mid-character still validates
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(content[:UTF8_SNIFF_BYTES])
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Please upload a UTF-8 encoded HTML file")
+    
+    return content
+
+def hash_upload(content: bytes) -> str:
+    """Cache key for an uploaded file"""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+async def parse_upload(content: bytes) -> Tuple[str, TransactionTable]:
+    """Hash an uploaded file and parse it, reusing earlier parses of the same file"""
+    # hashlib releases the GIL on large inputs, so a thread is enough here
+    file_hash = await asyncio.to_thread(hash_upload, content)
+    
+    transactions = parse_cache.get(file_hash)
+    if transactions is None:
+        loop = asyncio.get_running_loop()
+        transactions = await loop.run_in_executor(parse_pool, parse_transactions, content)
+        parse_cache[file_hash] = transactions
+    
+    return file_hash, transactions
+
+# Analyses currently running, by cache key, so concurrent identical requests
+# await one CrewAI run instead of each starting their own
+inflight_analyses: Dict[Tuple[str, str, str], asyncio.Task] = {}
+
+async def cached_analysis(file_hash: str, query: str, timeframe: str,
+                          transactions: TransactionTable) -> Dict:
+    """Run CrewAI analysis, reusing results for the same file, query and timeframe"""
+    key = (file_hash, query.lower().strip(), timeframe)
+    
+    insights = insight_cache.get(key)
+    if insights is not None:
+        return insights
+    
+    task = inflight_analyses.get(key)
+    if task is None:
+        async def run() -> Dict:
+            insights = await analyzer.analyze_with_crewai(query, timeframe, transactions)
+            # Don't cache failures so a transient LLM error can be retried
+            if "error" not in insights:
+                insight_cache[key] = insights
+            return insights
+        
+        task = asyncio.ensure_future(run())
+        inflight_analyses[key] = task
+        task.add_done_callback(lambda _: inflight_analyses.pop(key, None))
+    
+    # Shield the shared run so one client disconnecting doesn't cancel it for
+    # everyone else waiting on the same key
+    return await asyncio.shield(task)
+
+@app.on_event("startup")
+async def warm_up_llm():
+    """Build the LLM client and agents once, then warm the connection"""
+    configure_gemini_llm()
+    analyzer.setup_crew()
+    
+    # A tiny request up front pays the TLS/handshake cost here instead of
+    # on the first user's analysis. LLM() returns a provider-specific BaseLLM
+    # subclass (GeminiCompletion here), not an LLM instance.
+    if isinstance(gemini_llm, BaseLLM):
+        try:
+            await asyncio.to_thread(gemini_llm.call, "ping")
+            print("✅ Gemini LLM warmed up")
+        except Exception as e:
+            print(f"Warning: Gemini LLM warm-up failed: {e}")
+
+@app.on_event("shutdown")
+def shutdown_parse_pool():
+    parse_pool.shutdown(cancel_futures=True)
+
 @app.get("/")
 def read_root():
     return {"message": "Google Pay Smart Analyzer with CrewAI", "version": "2.0.0", "ai_engine": "CrewAI"}
@@ -362,20 +720,16 @@ async def upload_html(file: UploadFile = File(...)):
     if not file.filename.endswith('.html'):
         raise HTTPException(status_code=400, detail="Please upload an HTML file")
     
+    content = await read_upload(file)
+    
     try:
-        content = await file.read()
-        html_content = content.decode('utf-8')
-        
-        transactions = analyzer.parse_html_content(html_content)
+        _, transactions = await parse_upload(content)
         
         if not transactions:
             raise HTTPException(status_code=400, detail="No transactions found in HTML file")
         
-        total_amount = sum(t['amount'] for t in transactions)
-        date_range = {
-            'start': min(t['date'] for t in transactions),
-            'end': max(t['date'] for t in transactions)
-        }
+        total_amount = float(transactions.amounts.sum())
+        date_range = transactions.date_range()
         
         return {
             "status": "success",
@@ -385,7 +739,7 @@ async def upload_html(file: UploadFile = File(...)):
                 "total_amount": total_amount,
                 "date_range": date_range
             },
-            "transactions": transactions[:5]  # Preview
+            "transactions": transactions.to_records(5)  # Preview
         }
         
     except Exception as e:
@@ -402,26 +756,19 @@ async def analyze_transactions(
     if not file.filename.endswith('.html'):
         raise HTTPException(status_code=400, detail="Please upload an HTML file")
     
+    content = await read_upload(file)
+    
     try:
-        content = await file.read()
-        html_content = content.decode('utf-8')
-        
-        transactions = analyzer.parse_html_content(html_content)
+        file_hash, transactions = await parse_upload(content)
         
         if not transactions:
             raise HTTPException(status_code=400, detail="No transactions found in HTML file")
         
-        # Auto-detect timeframe from query
-        if timeframe == "all" and query:
-            if "month" in query.lower():
-                timeframe = "one month"
-            elif "week" in query.lower():
-                timeframe = "one week"
-            elif "year" in query.lower():
-                timeframe = "one year"
+        timeframe = detect_timeframe(query, timeframe)
         
-        # Get CrewAI insights
-        insights = analyzer.analyze_with_crewai(query, timeframe)
+        # Get CrewAI insights; pass this request's transactions explicitly so a
+        # concurrent upload replacing analyzer.transactions cannot leak in
+        insights = await cached_analysis(file_hash, query, timeframe, transactions)
         
         return {
             "status": "success",
@@ -435,6 +782,68 @@ async def analyze_transactions(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing transactions: {str(e)}")
 
+@app.post("/analyze-batch")
+async def analyze_transactions_batch(
+    file: UploadFile = File(...),
+    queries: str = Form(...)
+):
+    """Upload HTML file and run several CrewAI analyses concurrently
+    
+    `queries` is a JSON array of {"query": ..., "timeframe": ...} objects;
+    timeframe is optional and defaults to "all".
+    """
+    
+    if not file.filename.endswith('.html'):
+        raise HTTPException(status_code=400, detail="Please upload an HTML file")
+    
+    try:
+        batch = orjson.loads(queries)
+        if not isinstance(batch, list) or not all(
+            isinstance(r, dict)
+            and isinstance(r.get("query"), str) and r["query"]
+            and isinstance(r.get("timeframe", "all"), str)
+            for r in batch
+        ):
+            raise ValueError
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail='queries must be a JSON array of {"query": ..., "timeframe": ...} objects'
+        )
+    if len(batch) > MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_QUERIES} queries are allowed per batch"
+        )
+    
+    content = await read_upload(file)
+    
+    try:
+        file_hash, transactions = await parse_upload(content)
+        
+        if not transactions:
+            raise HTTPException(status_code=400, detail="No transactions found in HTML file")
+        
+        async def run_one(query: str, timeframe: str) -> Dict:
+            async with llm_semaphore:
+                insights = await cached_analysis(file_hash, query, timeframe, transactions)
+            return {"query": query, "timeframe": timeframe, "insights": insights}
+        
+        results = await asyncio.gather(*(
+            run_one(r["query"], detect_timeframe(r["query"], r.get("timeframe", "all")))
+            for r in batch
+        ))
+        
+        return {
+            "status": "success",
+            "total_transactions_parsed": len(transactions),
+            "results": results,
+            "ai_engine": "CrewAI"
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error analyzing transactions: {str(e)}")
+
 @app.post("/quick-insights")
 async def get_quick_insights(file: UploadFile = File(...)):
     """Upload HTML file and get quick spending insights"""
@@ -442,37 +851,20 @@ async def get_quick_insights(file: UploadFile = File(...)):
     if not file.filename.endswith('.html'):
         raise HTTPException(status_code=400, detail="Please upload an HTML file")
     
+    content = await read_upload(file)
+    
     try:
-        content = await file.read()
-        html_content = content.decode('utf-8')
-        
-        transactions = analyzer.parse_html_content(html_content)
+        _, transactions = await parse_upload(content)
         
         if not transactions:
             raise HTTPException(status_code=400, detail="No transactions found in HTML file")
         
-        # Calculate statistics with pure Python
-        amounts = [float(t['amount']) for t in transactions]
-        total_spend = sum(amounts)
-        avg_transaction = total_spend / len(amounts) if amounts else 0
-        
-        # Count recipients
-        recipient_counts = Counter([t['recipient'] for t in transactions])
-        top_merchant = recipient_counts.most_common(1)[0] if recipient_counts else ("N/A", 0)
+        # Statistics are O(n) too, so keep them off the event loop as well
+        insights = await asyncio.to_thread(compute_quick_insights, transactions)
         
         return {
             "status": "success",
-            "insights": {
-                "total_spend": float(total_spend),
-                "average_transaction": float(avg_transaction),
-                "transaction_count": len(transactions),
-                "top_merchant": top_merchant[0] if top_merchant != ("N/A", 0) else "N/A",
-                "top_merchant_count": top_merchant[1] if top_merchant != ("N/A", 0) else 0,
-                "date_range": {
-                    "start": min([t['date'] for t in transactions]) if transactions else None,
-                    "end": max([t['date'] for t in transactions]) if transactions else None
-                }
-            },
+            "insights": insights,
             "ai_engine": "CrewAI Ready"
         }
         
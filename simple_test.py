@@ -21,15 +21,49 @@ try:
     print("🧪 Testing Google Pay CrewAI Analyzer...")
     
     # Import our analyzer
-    from crewai_app import GPPayAnalyzer
+    import numpy as np
+    from crewai_app import GPPayAnalyzer, configure_gemini_llm
     
     # Test parsing
+    configure_gemini_llm()
     analyzer = GPPayAnalyzer()
+    analyzer.setup_crew()
     transactions = analyzer.parse_html_content(sample_html)
     
     print(f"✅ HTML Parsing: Found {len(transactions)} transactions")
     if transactions:
-        print(f"   Sample transaction: {transactions[0]}")
+        print(f"   Sample transaction: {transactions.to_records(1)[0]}")
+    
+    # Test parsing the bundled export against known-good output
+    with open(os.path.join(os.path.dirname(__file__), "My Activity.html"), "rb") as f:
+        export = analyzer.parse_html_content(f.read())
+    records = {tx["id"]: tx for tx in export.to_records()}
+    
+    assert len(export) == 256, f"expected 256 transactions, got {len(export)}"
+    assert records["tx_0"] == {
+        "amount": 20.0, "recipient": "Omkar_Medical_", "date": "2025-10-10",
+        "payment_method": "Bank Account", "id": "tx_0"
+    }, records["tx_0"]
+    assert records["tx_332"] == {
+        "amount": 994.0, "recipient": "CHIRROS NX", "date": "2024-07-01",
+        "payment_method": "Bank Account", "id": "tx_332"
+    }, records["tx_332"]
+    assert records["tx_412"] == {
+        "amount": 10.0, "recipient": "Indian Railways Ticketing", "date": "2023-12-27",
+        "payment_method": "Bank Account", "id": "tx_412"
+    }, records["tx_412"]
+    print(f"✅ Export Parsing: Found {len(export)} transactions")
+    
+    # Test that timeframes are a date window ending at the newest transaction
+    newest = max(tx["date"] for tx in records.values())
+    for timeframe, days, count in (("one week", 7, 5), ("three month", 90, 22)):
+        cutoff = str(np.datetime64(newest) - np.timedelta64(days, "D"))
+        window_ids = {tx["id"] for tx in analyzer.filter_by_timeframe(timeframe).to_records()}
+        expected_ids = {tx_id for tx_id, tx in records.items() if tx["date"] > cutoff}
+        
+        assert window_ids == expected_ids, f"{timeframe} kept {sorted(window_ids)}, expected {sorted(expected_ids)}"
+        assert len(window_ids) == count, f"{timeframe} kept {len(window_ids)} transactions, expected {count}"
+    print(f"✅ Timeframe Filter: Date windows end at the newest transaction ({newest})")
     
     # Test if CrewAI is set up
     if hasattr(analyzer, 'financial_analyst') and analyzer.financial_analyst:
@@ -44,4 +78,5 @@ try:
 except Exception as e:
     print(f"❌ Error: {e}")
     print("Make sure all dependencies are installed:")
-    print("pip install fastapi uvicorn crewai google-generativeai beautifulsoup4 python-dotenv")
\ No newline at end of file
+    print("pip install fastapi uvicorn crewai google-generativeai beautifulsoup4 python-dotenv")
+    sys.exit(1)
\ No newline at end of file